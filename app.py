@@ -1,11 +1,9 @@
 import streamlit as st
+import hashlib
+import json
 import os
+import time
 from dotenv import load_dotenv
-from groq import Groq
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
-from pypdf import PdfReader
 
 # =========================================================
 # CONFIG
@@ -24,24 +22,16 @@ if not GROQ_API_KEY:
     st.error("❌ GROQ_API_KEY not found in environment / secrets")
     st.stop()
 
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
+# Replies keyed by a hash of the prompt, shared by all sessions for an hour.
+# Filled after a streamed reply completes (st.cache_data can't cache a stream)
+CHAT_CACHE_TTL = 3600
 
-# =========================================================
-# EMBEDDING + FAISS SETUP
-# =========================================================
 @st.cache_resource
-def load_embedding_model():
-    return SentenceTransformer("all-MiniLM-L6-v2")
-
-embed_model = load_embedding_model()
-EMBED_DIM = 384
-
-if "faiss_index" not in st.session_state:
-    st.session_state.faiss_index = faiss.IndexFlatL2(EMBED_DIM)
+def get_reply_cache():
+    return {}
 
-if "documents" not in st.session_state:
-    st.session_state.documents = []
+def prompt_hash(messages):
+    return hashlib.sha256(json.dumps(messages).encode()).hexdigest()
 
 # =========================================================
 # MAIN UI
@@ -62,23 +52,22 @@ menu = st.sidebar.selectbox(
 # 1️⃣ CHAT AGENT
 # =========================================================
 if menu == "Chat Agent":
+    from groq import Groq
+
     st.header("💬 Chat Agent")
 
+    # Initialize Groq client
+    client = Groq(api_key=GROQ_API_KEY)
+
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
 
     user_input = st.text_input("You:")
 
-    if st.button("Send") and user_input:
-        st.session_state.chat_history.append(("user", user_input))
+    send = st.button("Send") and user_input
 
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[{"role": "user", "content": user_input}]
-        )
-
-        reply = response.choices[0].message.content
-        st.session_state.chat_history.append(("assistant", reply))
+    if send:
+        st.session_state.chat_history.append(("user", user_input))
 
     for role, msg in st.session_state.chat_history:
         if role == "user":
@@ -86,46 +75,94 @@ if menu == "Chat Agent":
         else:
             st.markdown(f"**🤖 AI:** {msg}")
 
+    if send:
+        messages = [{"role": "user", "content": user_input}]
+        key = prompt_hash(messages)
+        reply_cache = get_reply_cache()
+        cached = reply_cache.get(key)
+
+        if cached and time.time() - cached[0] < CHAT_CACHE_TTL:
+            reply = cached[1]
+            st.markdown(f"**🤖 AI:** {reply}")
+        else:
+            # Stream tokens as they arrive instead of blocking on the full completion
+            stream = client.chat.completions.create(
+                model="llama3-8b-8192",
+                messages=messages,
+                stream=True
+            )
+
+            def stream_reply():
+                yield "**🤖 AI:** "
+                for chunk in stream:
+                    yield chunk.choices[0].delta.content or ""
+
+            reply = st.write_stream(stream_reply()).removeprefix("**🤖 AI:** ")
+
+            now = time.time()
+            for k, (ts, _) in list(reply_cache.items()):
+                if now - ts >= CHAT_CACHE_TTL:
+                    reply_cache.pop(k, None)
+            reply_cache[key] = (now, reply)
+
+        st.session_state.chat_history.append(("assistant", reply))
+
 # =========================================================
-# 2️⃣ DOCUMENT AGENT (FAISS)
+# 2️⃣ DOCUMENT AGENT (FAISS HNSW)
 # =========================================================
 elif menu == "Document Agent":
+    # Embedding model, torch and FAISS are only loaded for this agent
+    from veera.core import chunk_text, extract_pdf_text, index_chunks, search, store
+
     st.header("📄 Document Agent")
 
-    uploaded = st.file_uploader("Upload PDF", type=["pdf"])
+    # Chunks of uploaded PDFs waiting for the next batched encode
+    if "pending_chunks" not in st.session_state:
+        st.session_state.pending_chunks = []
+        st.session_state.queued_files = set()
 
-    if uploaded:
-        reader = PdfReader(uploaded)
-        text = ""
+    uploaded_files = st.file_uploader(
+        "Upload PDF", type=["pdf"], accept_multiple_files=True
+    )
+
+    # Queue chunks per upload; Streamlit reruns must not re-queue a file
+    for uploaded in uploaded_files:
+        if uploaded.file_id in st.session_state.queued_files:
+            continue
+        st.session_state.queued_files.add(uploaded.file_id)
 
-        for page in reader.pages:
-            content = page.extract_text()
-            if content:
-                text += content
+        text = extract_pdf_text(uploaded.getvalue())
 
         if text.strip():
-            st.session_state.documents.append(text)
-            emb = embed_model.encode([text])
-            st.session_state.faiss_index.add(
-                np.array(emb).astype("float32")
+            st.session_state.pending_chunks.extend(
+                (uploaded.name, chunk) for chunk in chunk_text(text)
             )
-            st.success("✅ Document indexed successfully")
         else:
-            st.warning("⚠ Could not extract text from PDF")
+            st.warning(f"⚠ Could not extract text from {uploaded.name}")
+
+    pending = st.session_state.pending_chunks
 
-    query = st.text_input("Ask a question from documents:")
+    if pending:
+        st.info(f"📥 {len(pending)} chunks waiting to be indexed")
 
-    if st.button("Search") and query:
-        if not st.session_state.documents:
+    if st.button("Index") and pending:
+        with st.spinner("Indexing documents..."):
+            index_chunks(pending)
+        st.session_state.pending_chunks = []
+        st.success(f"✅ Indexed {len(pending)} chunks successfully")
+
+    questions = st.text_area("Ask questions from documents (one per line):")
+    queries = [q.strip() for q in questions.splitlines() if q.strip()]
+
+    if st.button("Search") and queries:
+        if not store["num_embeddings"]:
             st.warning("No documents indexed yet")
         else:
-            q_emb = embed_model.encode([query])
-            _, idx = st.session_state.faiss_index.search(
-                np.array(q_emb).astype("float32"), k=1
-            )
-            context = st.session_state.documents[idx[0][0]]
-            st.subheader("🔎 Relevant Content")
-            st.write(context[:600])
+            for query, hits in zip(queries, search(queries)):
+                st.subheader(f"🔎 {query}")
+                for rank, (doc, chunk) in enumerate(hits):
+                    with st.expander(f"📄 {doc}", expanded=rank == 0):
+                        st.write(chunk)
 
 # =========================================================
 # 3️⃣ VOICE AGENT (TEMPORARILY DISABLED)
@@ -0,0 +1,342 @@
+import streamlit as st
+import io
+import os
+import sqlite3
+import threading
+from sentence_transformers import SentenceTransformer
+import numpy as np
+import torch
+from pypdf import PdfReader
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import faiss
+except ImportError:  # no usable faiss-cpu wheel on this platform
+    faiss = None
+
+# =========================================================
+# EMBEDDING + FAISS SETUP
+# =========================================================
+if torch.cuda.is_available():
+    EMBED_DEVICE = "cuda"
+elif torch.backends.mps.is_available():
+    EMBED_DEVICE = "mps"
+else:
+    EMBED_DEVICE = "cpu"
+
+# Dynamic int8 (MatMul) ONNX export shipped with the model; u8 x s8 GEMMs
+# map onto AVX2 / AVX-VNNI kernels in ONNX Runtime
+EMBED_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+@st.cache_resource
+def load_embedding_model():
+    # The int8 ONNX graph is a CPU path; GPUs run the PyTorch model,
+    # in FP16 on CUDA to halve activation traffic and use tensor cores
+    if EMBED_DEVICE != "cpu":
+        model = SentenceTransformer("all-MiniLM-L6-v2", device=EMBED_DEVICE)
+        if EMBED_DEVICE == "cuda":
+            model.half()
+    else:
+        model = SentenceTransformer(
+            "all-MiniLM-L6-v2",
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": EMBED_ONNX_FILE}
+        )
+
+    # Warm up once per process (tokenizer, ORT session / CUDA context and
+    # kernels) so the first real query doesn't pay for it
+    model.encode(["warmup"], convert_to_numpy=True)
+    return model
+
+embed_model = load_embedding_model()
+EMBED_DIM = 384
+
+# Once per process: use every core for FAISS and log which SIMD build got
+# loaded ("AVX2" / "AVX512" carry the prefetching HNSW / distance kernels)
+@st.cache_resource
+def configure_faiss():
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+    print(f"FAISS {faiss.__version__} compile options: {faiss.get_compile_options()}")
+
+if faiss is not None:
+    configure_faiss()
+
+# Embeddings are L2-normalized at encode time, so inner product ranks the same
+# as cosine / L2 at roughly half the arithmetic per distance
+#
+# HNSW graph: ~O(log N) search instead of a linear scan over every vector.
+# Vectors are stored as 8-bit scalar-quantized codes (384 B instead of 1536 B)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = 32
+
+def make_index():
+    index = faiss.IndexHNSWSQ(
+        EMBED_DIM, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+    )
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+# IVF: once the corpus is large enough, only scan ~nprobe/nlist of the vectors
+IVF_THRESHOLD = 1000
+
+def make_ivf_index(embs):
+    nlist = max(int(2 * np.sqrt(len(embs))), 20)
+    nprobe = min(nlist // 4, 10)
+    quantizer = faiss.IndexFlatIP(EMBED_DIM)
+    index = faiss.IndexIVFScalarQuantizer(
+        quantizer, EMBED_DIM, nlist, faiss.ScalarQuantizer.QT_8bit,
+        faiss.METRIC_INNER_PRODUCT
+    )
+    index.train(embs)
+    index.add(embs)
+    index.nprobe = nprobe
+    return index
+
+def build_index(embs):
+    # The 8-bit quantizer learns per-dimension ranges from embs, so indexes
+    # are always (re)built from every embedding stored so far
+    if len(embs) >= IVF_THRESHOLD:
+        return make_ivf_index(embs)
+
+    index = make_index()
+    index.train(embs)
+    index.add(embs)
+    return index
+
+# Index, raw embeddings and chunk texts live on disk and are shared by
+# every session, so reruns, new sessions and restarts keep the corpus
+INDEX_PATH = "index.faiss"
+EMBEDDINGS_PATH = "embeddings.f32"
+CHUNKS_DB_PATH = "chunks.db"
+
+def map_embeddings(n):
+    # Read-only memory map of the raw embeddings kept for retraining; the OS
+    # pages them in during a rebuild instead of every process holding a copy
+    if not n:
+        return np.empty((0, EMBED_DIM), dtype=np.float32)
+    return np.memmap(
+        EMBEDDINGS_PATH, dtype=np.float32, mode="r", shape=(n, EMBED_DIM)
+    )
+
+def write_index(index):
+    # Write then rename, so a failed write never leaves a truncated index.faiss
+    tmp_path = INDEX_PATH + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, INDEX_PATH)
+
+@st.cache_resource
+def get_vector_store():
+    db = sqlite3.connect(CHUNKS_DB_PATH, check_same_thread=False)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS chunks "
+        "(id INTEGER PRIMARY KEY, doc TEXT NOT NULL, text TEXT NOT NULL)"
+    )
+
+    # Chunk rows commit last, so they mark what was fully indexed. Drop any
+    # embeddings past them, including a partial trailing row from an
+    # interrupted write, so every memmap row stays aligned
+    num_embeddings = 0
+    if os.path.exists(EMBEDDINGS_PATH):
+        num_embeddings = os.path.getsize(EMBEDDINGS_PATH) // (4 * EMBED_DIM)
+    with db:
+        db.execute("DELETE FROM chunks WHERE id >= ?", (num_embeddings,))
+    num_embeddings = db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    if os.path.exists(EMBEDDINGS_PATH):
+        os.truncate(EMBEDDINGS_PATH, num_embeddings * 4 * EMBED_DIM)
+    embs = map_embeddings(num_embeddings)
+
+    index = None
+    if faiss is not None:
+        if os.path.exists(INDEX_PATH):
+            index = faiss.read_index(INDEX_PATH)
+        else:
+            index = make_index()
+
+        # Rebuild from the raw embeddings when the saved index is out of step
+        # with them, or was saved with the old L2 metric
+        if (
+            index.ntotal != num_embeddings
+            or index.metric_type != faiss.METRIC_INNER_PRODUCT
+        ):
+            index = build_index(embs) if num_embeddings else make_index()
+            write_index(index)
+
+    return {
+        "lock": threading.Lock(),
+        "index": index,
+        "embeddings": embs,
+        "num_embeddings": num_embeddings,
+        "trained_at": index.ntotal if index is not None else 0,
+        "db": db,
+    }
+
+store = get_vector_store()
+
+def add_embeddings(embs):
+    with open(EMBEDDINGS_PATH, "ab") as f:
+        embs.tofile(f)
+    n = store["num_embeddings"] = store["num_embeddings"] + len(embs)
+    store["embeddings"] = map_embeddings(n)
+
+    if faiss is None:
+        return
+
+    # Rebuild (and retrain) on the first add, on crossing the IVF threshold
+    # and every time the corpus doubles, so the quantizer ranges and
+    # nlist / nprobe stay tuned to the corpus
+    trained_at = store["trained_at"]
+    if n >= 2 * trained_at or trained_at < IVF_THRESHOLD <= n:
+        store["index"] = build_index(store["embeddings"])
+        store["trained_at"] = n
+    else:
+        store["index"].add(embs)
+
+def index_chunks(chunks):
+    # chunks: list of (doc_name, chunk_text); FAISS row id == SQLite row id
+    embs = encode([text for _, text in chunks])
+
+    with store["lock"]:
+        start = store["num_embeddings"]
+        index = store["index"]
+        trained_at = store["trained_at"]
+
+        # The rows only commit once the embeddings file and the index are
+        # written; on any failure all three roll back to `start` together
+        try:
+            with store["db"]:
+                store["db"].executemany(
+                    "INSERT INTO chunks (id, doc, text) VALUES (?, ?, ?)",
+                    [(start + i, doc, text) for i, (doc, text) in enumerate(chunks)]
+                )
+                add_embeddings(embs)
+                if faiss is not None:
+                    write_index(store["index"])
+        except Exception:
+            if os.path.exists(EMBEDDINGS_PATH):
+                os.truncate(EMBEDDINGS_PATH, start * 4 * EMBED_DIM)
+            store["num_embeddings"] = start
+            store["embeddings"] = map_embeddings(start)
+
+            if index is not None and index.ntotal != start:
+                # Added to in place; FAISS graphs can't drop rows, so rebuild
+                index = build_index(store["embeddings"]) if start else make_index()
+                trained_at = start
+            store["index"] = index
+            store["trained_at"] = trained_at
+            raise
+
+# Without FAISS, fall back to an exact scan of the embedding buffer
+if faiss is None:
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True)
+    def ip_scores(X, q):
+        scores = np.empty(X.shape[0], dtype=np.float32)
+        for i in prange(X.shape[0]):
+            s = np.float32(0.0)
+            for j in range(X.shape[1]):
+                s += X[i, j] * q[j]
+            scores[i] = s
+        return scores
+
+SEARCH_TOP_K = 5
+
+def search(queries, k=SEARCH_TOP_K):
+    # Every question is encoded and searched in one batched call, so FAISS
+    # scans the index once for the whole (Nq, d) query matrix
+    q_embs = encode(queries)
+
+    with store["lock"]:
+        if faiss is None:
+            embs = np.asarray(store["embeddings"])
+            idx = [np.argsort(-ip_scores(embs, q))[:k] for q in q_embs]
+        else:
+            _, idx = store["index"].search(q_embs, k=k)
+
+        rows = [[int(i) for i in row if i >= 0] for row in idx]
+        ids = sorted({i for row in rows for i in row})
+        placeholders = ",".join("?" * len(ids))
+        chunks = {
+            i: (doc, text)
+            for i, doc, text in store["db"].execute(
+                f"SELECT id, doc, text FROM chunks WHERE id IN ({placeholders})", ids
+            )
+        }
+
+    # Skip any row without a chunk rather than failing the whole search
+    return [[chunks[i] for i in row if i in chunks] for row in rows]
+
+# Large ingestion batches are spread over every GPU when there are several
+MULTI_GPU_MIN_TEXTS = 1024
+
+@st.cache_resource
+def get_encode_pool():
+    return embed_model.start_multi_process_pool()
+
+def encode(texts):
+    if torch.cuda.device_count() > 1 and len(texts) >= MULTI_GPU_MIN_TEXTS:
+        embs = embed_model.encode_multi_process(
+            texts,
+            get_encode_pool(),
+            batch_size=64,
+            normalize_embeddings=True
+        )
+    else:
+        # One call for the whole batch; sentence-transformers sorts the inputs
+        # by length so each batch of 64 carries as little padding as possible
+        embs = embed_model.encode(
+            texts,
+            batch_size=64,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            device=EMBED_DEVICE
+        )
+
+    # FAISS wants contiguous FP32; this is a no-op unless the model ran in
+    # FP16 or the multi-GPU pool handed back a non-contiguous array
+    return np.ascontiguousarray(embs, dtype=np.float32)
+
+# MiniLM truncates at max_seq_length tokens including [CLS] / [SEP], so embed
+# overlapping windows that fit exactly
+CHUNK_TOKENS = embed_model.max_seq_length - 2
+CHUNK_OVERLAP = 32
+
+def chunk_text(text):
+    # Slice the original text by token offsets instead of decoding the ids:
+    # the uncased WordPiece decoder lowercases, strips accents and leaves
+    # "##" / [UNK] pieces in what the Document Agent shows
+    offsets = embed_model.tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+    )["offset_mapping"]
+    if not offsets:
+        return []
+
+    step = CHUNK_TOKENS - CHUNK_OVERLAP
+    return [
+        text[offsets[i][0]:offsets[min(i + CHUNK_TOKENS, len(offsets)) - 1][1]]
+        for i in range(0, max(len(offsets) - CHUNK_OVERLAP, 1), step)
+    ]
+
+def extract_pdf_text(data):
+    num_pages = len(PdfReader(io.BytesIO(data)).pages)
+    if not num_pages:
+        return ""
+
+    workers = min(os.cpu_count() or 1, num_pages)
+    step = -(-num_pages // workers)
+
+    # Each worker opens its own reader: pages of one PdfReader share a
+    # single seekable stream and can't be decoded concurrently
+    def extract_pages(start):
+        reader = PdfReader(io.BytesIO(data))
+        return "".join(
+            reader.pages[i].extract_text() or ""
+            for i in range(start, min(start + step, num_pages))
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return "".join(ex.map(extract_pages, range(0, num_pages, step)))